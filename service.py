@@ -5,6 +5,7 @@ from numpy import random
 #from fastbook import *
 from fastai.tabular.all import *
 import pandas as pd
+import pyarrow as pa
 #import matplotlib.pyplot as plt
 #from fastai.imports import *
 #np.set_printoptions(linewidth=130)
@@ -36,24 +37,24 @@ class PharmaSalesRegressor:
 
     def __init__(self):
         self.model = bentoml.xgboost.load_model(self.bento_model)
-
-    def preprocess(self, data):
+        #fit the tabular procs on the training set once, so every request
+        #(and every client-side chunk) is normalized with the same statistics
         path = Path('data/')
         train_df = pd.read_csv(path/'train.csv')
-        test_df = pd.read_csv(path/'test.csv')
         #train_df = train_df.dropna(subset=['num_sold'])
         #train_df = add_datepart(train_df,'date',drop=False)
-        #test_df = add_datepart(test_df,'date',drop=False)
         cont_names,cat_names = cont_cat_split(train_df, dep_var='Sales')
-        splits = RandomSplitter(valid_pct=0.2)(range_of(train_df))
+        splits = RandomSplitter(valid_pct=0.2, seed=42)(range_of(train_df))
         to = TabularPandas(train_df, procs=[Categorify, FillMissing,Normalize],
                            cat_names = cat_names,
                            cont_names = cont_names,
                            y_names='Sales',
                            y_block=CategoryBlock(),
                            splits=splits)
-        dls = to.dataloaders(bs=64)
-        test_dl = dls.test_dl(data)
+        self.dls = to.dataloaders(bs=64)
+
+    def preprocess(self, data):
+        test_dl = self.dls.test_dl(data)
         test_df_new = test_dl.xs
         return test_df_new
     
@@ -109,4 +110,11 @@ class PharmaSalesRegressor:
         csv_data = self.preprocess(csv_data)
         prediction_csv = self.model.predict(csv_data)
         return prediction_csv
-    
\ No newline at end of file
+
+    @bentoml.api()
+    def predict_arrow(self,table:Path) -> np.ndarray:
+        with pa.OSFile(str(table), 'rb') as source:
+            arrow_data = pa.ipc.open_stream(source).read_all().to_pandas()
+        arrow_data = self.preprocess(arrow_data)
+        prediction_arrow = self.model.predict(arrow_data)
+        return prediction_arrow
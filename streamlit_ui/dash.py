@@ -1,29 +1,298 @@
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import streamlit as st
+from numba import njit
+import numpy as np
+import orjson
 import pandas as pd
+import pyarrow as pa
 import requests
+from requests.adapters import HTTPAdapter
 import plotly.express as px
 
-def load_and_predict_data(csv_path):
+PREDICT_CSV_URL = "http://localhost:3000/predict_csv"
+PREDICT_ARROW_URL = "http://localhost:3000/predict_arrow"
+ARROW_STREAM_MIME = 'application/vnd.apache.arrow.stream'
+
+# Rows per prediction request and number of requests in flight at once;
+# MAX_WORKERS matches the HTTP connection pool size
+CHUNK_ROWS = 5000
+MAX_WORKERS = 8
+
+# Rows sent to the browser per page of the detailed data view
+PAGE_SIZE = 200
+
+MONTH_ORDER = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+# Low-cardinality text columns stored as pandas categoricals for fast filtering
+CATEGORY_COLUMNS = ['Country', 'Channel', 'Product Class', 'Sales Team',
+                    'Distributor', 'Product Name', 'Month']
+
+# Columns exposed as sidebar filters
+FILTER_COLUMNS = ['Country', 'Channel', 'Product Class', 'Sales Team']
+
+# Columns shown in the detailed data view
+DISPLAY_COLUMNS = ['month_year', 'Distributor', 'Customer Name', 'Country', 
+                   'Channel', 'Product Name', 'Product Class', 
+                   'Quantity', 'Price', 'predicted_sales']
+
+@st.cache_resource
+def get_http():
     """
-    Sends the test CSV to the BentoML API endpoint and gets predictions
+    Returns a pooled requests.Session shared across reruns so the
+    BentoML connection is kept alive between predictions
     """
-    files = {'csv': open(csv_path, 'rb')}
-    response = requests.post(
-        "http://localhost:3000/predict_csv",
-        files=files
-    )
-    predictions = response.json()
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    # Whether the service exposes predict_arrow; None until the first request
+    session.arrow_supported = None
+    return session
+
+def to_arrow_stream(chunk):
+    """
+    Serializes a chunk of rows to Arrow IPC stream bytes
+    """
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+@njit(cache=True)
+def top_key(codes, vals, n_keys):
+    """
+    One-pass sum of vals per category code, returning the code with the largest
+    total and that total; codes never seen (or -1 for missing) are ignored
+    """
+    acc = np.zeros(n_keys, np.float64)
+    seen = np.zeros(n_keys, np.bool_)
+    for i in range(codes.size):
+        c = codes[i]
+        if c >= 0:
+            acc[c] += vals[i]
+            seen[c] = True
+    best = -1
+    for k in range(n_keys):
+        if seen[k] and (best < 0 or acc[k] > acc[best]):
+            best = k
+    if best < 0:
+        return best, 0.0
+    return best, acc[best]
+
+def top_category(df, col):
+    """
+    Returns the category of col with the highest total predicted sales and that total,
+    or 'N/A' when no row has a value in col
+    """
+    categories = df[col].cat.categories
+    k, total = top_key(df[col].cat.codes.values, df['predicted_sales'].values, len(categories))
+    if k < 0:
+        return 'N/A', total
+    return categories[k], total
+
+def predict_chunk(http, chunk):
+    """
+    Sends one chunk of rows to the BentoML API endpoint and returns its predictions.
+    Uses the Arrow endpoint and falls back to CSV on services that don't expose it;
+    the first 404 is remembered on the session so later chunks go straight to CSV.
+    """
+    response = None
+    if http.arrow_supported is not False:
+        files = {'table': ('data.arrow', to_arrow_stream(chunk), ARROW_STREAM_MIME)}
+        response = http.post(PREDICT_ARROW_URL, files=files, timeout=30)
+        http.arrow_supported = response.status_code != 404
+    if not http.arrow_supported:
+        files = {'csv': ('data.csv', chunk.to_csv(index=False).encode(), 'text/csv')}
+        response = http.post(PREDICT_CSV_URL, files=files, timeout=30)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def predict_sales(http, test_df, on_progress):
+    """
+    Posts fixed-size chunks of test_df concurrently so upload and inference overlap
+    across the service's workers, calling on_progress(done, total) as each chunk
+    completes. Returns the predictions in row order.
+    """
+    chunks = [test_df.iloc[i:i + CHUNK_ROWS] for i in range(0, len(test_df), CHUNK_ROWS)]
+    predictions = [None] * len(chunks)
+    done = 0
+    
+    # Until the session knows which endpoint the service exposes, send the first
+    # chunk alone so the rest don't each try Arrow and then retry as CSV
+    if chunks and http.arrow_supported is None:
+        predictions[0] = predict_chunk(http, chunks[0])
+        done = 1
+        on_progress(done, len(chunks))
+    
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(predict_chunk, http, chunk): i
+                   for i, chunk in enumerate(chunks) if predictions[i] is None}
+        for future in as_completed(futures):
+            predictions[futures[future]] = future.result()
+            done += 1
+            on_progress(done, len(chunks))
     
+    # A header-only upload has no chunks
+    if not predictions:
+        return np.empty(0, dtype=np.float32)
+    return np.concatenate(predictions).astype(np.float32)
+
+@st.cache_resource(ttl=3600, max_entries=8, show_spinner=False)
+def get_upload_slot(file_hash):
+    """
+    Returns the shared holder for one upload's prepared DataFrame and filter
+    options. Holds no Streamlit elements, so cache hits replay nothing to the browser.
+    """
+    return {}
+
+def load_and_predict_data(file_hash, csv_bytes):
+    """
+    Returns the prepared DataFrame and sidebar filter options for an upload,
+    reused across reruns and sessions through the slot cached on the file's MD5.
+    The progress bar is only drawn when the upload actually has to be predicted.
+    """
+    slot = get_upload_slot(file_hash)
+    if 'data' not in slot:
+        progress = st.progress(0.0, text="Predicting sales...")
+        
+        def on_progress(done, total):
+            progress.progress(done / total, text=f"Predicting sales... {done}/{total} chunks")
+        
+        slot['data'] = prepare_data(csv_bytes, get_http(), on_progress)
+        progress.empty()
+    return slot['data']
+
+def prepare_data(csv_bytes, http, on_progress):
+    """
+    Sends the test CSV to the BentoML API endpoint and gets predictions, returning
+    the DataFrame and the sidebar filter options
+    """
     # Load the original test data
-    test_df = pd.read_csv(csv_path)
+    test_df = pd.read_csv(io.BytesIO(csv_bytes))
     
     # Add predictions to the dataframe
-    test_df['predicted_sales'] = predictions
+    test_df['predicted_sales'] = predict_sales(http, test_df, on_progress)
+    
+    # Downcast numeric columns to halve the bytes scanned by masks and groupbys
+    test_df['Quantity'] = pd.to_numeric(test_df['Quantity'], downcast='integer')
+    test_df['Price'] = test_df['Price'].astype('float32')
+    test_df['Year'] = test_df['Year'].astype('int16')
+    
+    # Build a monthly period from Month/Year with one vectorized conversion
+    month_num = test_df['Month'].map({m: i + 1 for i, m in enumerate(MONTH_ORDER)})
+    test_df['period'] = pd.to_datetime(
+        pd.DataFrame({'year': test_df['Year'], 'month': month_num, 'day': 1})
+    ).dt.to_period('M')
+    
+    # Month-year labels are formatted once per unique period and stored as an
+    # ordered categorical, so sorting by month_year is chronological
+    codes, periods = pd.factorize(test_df['period'], sort=True)
+    test_df['month_year'] = pd.Categorical.from_codes(
+        codes, categories=periods.strftime('%B %Y'), ordered=True
+    )
     
-    # Combine Month and Year into a single column
-    test_df['month_year'] = test_df['Month'] + ' ' + test_df['Year'].astype(str)
+    # Filters and groupbys then compare integer codes instead of strings
+    for col in CATEGORY_COLUMNS:
+        test_df[col] = test_df[col].astype('category')
     
-    return test_df
+    # Sidebar options come straight from the category dictionaries
+    options = {col: ['All'] + sorted(test_df[col].cat.categories.tolist())
+               for col in FILTER_COLUMNS}
+    
+    return test_df, options
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def compute_view(file_hash, _df, country, channel, product_class, sales_team):
+    """
+    Applies the sidebar filters and computes the KPI values, monthly series and
+    sorted row positions for the detail table. Cached on the file hash and filter tuple so toggling back to
+    a previous selection is a lookup. Returns None when no rows match.
+    """
+    selections = {
+        'Country': country,
+        'Channel': channel,
+        'Product Class': product_class,
+        'Sales Team': sales_team,
+    }
+    
+    # Apply filters as one combined mask over the category codes
+    mask = np.ones(len(_df), dtype=bool)
+    for col, value in selections.items():
+        if value != 'All':
+            mask &= _df[col].cat.codes.values == _df[col].cat.categories.get_loc(value)
+    filtered_df = _df.iloc[mask]
+    
+    # No matching rows: the caller shows a warning instead of the KPIs
+    if filtered_df.empty:
+        return None
+    
+    # Calculate metrics for KPI cards; predictions are stored as float32 but
+    # summed in float64 so the dollar totals stay exact to the unit
+    sales = filtered_df['predicted_sales'].astype('float64')
+    total_sales = sales.sum()
+    monthly_sales_series = (sales.groupby(filtered_df['period'], sort=True, observed=True)
+                            .sum())
+    
+    # Mean of the monthly totals is the total spread over the months present
+    n_months = len(monthly_sales_series)
+    avg_monthly_sales = total_sales / n_months if n_months else 0.0
+    
+    # Jitted single pass over the category codes; no grouped series is built
+    top_distributor, distributor_sales = top_category(filtered_df, 'Distributor')
+    top_product, product_sales = top_category(filtered_df, 'Product Name')
+    
+    # Monthly totals are already in period order; format labels last, once per month
+    monthly_sales = monthly_sales_series.reset_index()
+    monthly_sales['month_year'] = monthly_sales['period'].dt.strftime('%B %Y')
+    
+    # Detailed data view: only the row positions into the base DataFrame are
+    # cached, stably sorted by period so pagination is consistent across reruns
+    order = np.argsort(filtered_df['period'].array.asi8, kind='mergesort')
+    row_positions = np.flatnonzero(mask)[order]
+    
+    return {
+        'total_sales': total_sales,
+        'avg_monthly_sales': avg_monthly_sales,
+        'top_distributor': top_distributor,
+        'distributor_sales': distributor_sales,
+        'top_product': top_product,
+        'product_sales': product_sales,
+        'monthly_sales': monthly_sales,
+        'row_positions': row_positions,
+    }
+
+@st.cache_data(
+    ttl=3600,
+    max_entries=64,
+    show_spinner=False,
+    hash_funcs={pd.DataFrame: lambda d: pd.util.hash_pandas_object(d, index=True).values.tobytes()},
+)
+def build_monthly_chart(monthly_sales):
+    """
+    Builds the predicted monthly sales line chart, cached on the monthly aggregate
+    """
+    # Create the line chart using Plotly with dark theme
+    fig = px.line(
+        monthly_sales,
+        x='month_year',
+        y='predicted_sales',
+        title='Predicted Monthly Sales'
+    )
+    
+    # Update layout for dark theme
+    fig.update_layout(
+        template="plotly_dark",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        xaxis_title="Month-Year",
+        yaxis_title="Predicted Sales",
+        hovermode='x unified'
+    )
+    
+    return fig
 
 def create_dashboard():
     """
@@ -34,7 +303,12 @@ def create_dashboard():
     # Add custom CSS for dark theme cards
     st.markdown("""
         <style>
+        .metric-row {
+            display: flex;
+            gap: 16px;
+        }
         .metric-card {
+            flex: 1;
             background-color: #2C3333;
             padding: 20px;
             border-radius: 10px;
@@ -62,147 +336,91 @@ def create_dashboard():
     uploaded_file = st.file_uploader("Upload test CSV file", type=['csv'])
     
     if uploaded_file is not None:
-        # Save the uploaded file temporarily
-        with open('temp_test.csv', 'wb') as f:
-            f.write(uploaded_file.getvalue())
-        
         # Load data and get predictions
-        df = load_and_predict_data('temp_test.csv')
+        csv_bytes = uploaded_file.getvalue()
+        file_hash = hashlib.md5(csv_bytes).hexdigest()
+        df, options = load_and_predict_data(file_hash, csv_bytes)
         
-        # Creating filters in a sidebar
+        # Creating filters in a sidebar form so changes rerun once, on Apply
         st.sidebar.header("Filters")
         
-        # Country filter
-        countries = ['All'] + sorted(df['Country'].unique().tolist())
-        selected_country = st.sidebar.selectbox('Select Country', countries)
-        
-        # Channel filter
-        channels = ['All'] + sorted(df['Channel'].unique().tolist())
-        selected_channel = st.sidebar.selectbox('Select Channel', channels)
-        
-        # Product Class filter
-        product_classes = ['All'] + sorted(df['Product Class'].unique().tolist())
-        selected_product_class = st.sidebar.selectbox('Select Product Class', product_classes)
-        
-        # Sales Team filter
-        sales_teams = ['All'] + sorted(df['Sales Team'].unique().tolist())
-        selected_sales_team = st.sidebar.selectbox('Select Sales Team', sales_teams)
-        
-        # Apply filters
-        filtered_df = df.copy()
+        with st.sidebar.form('filters'):
+            # Country filter
+            country = st.selectbox('Select Country', options['Country'])
+            
+            # Channel filter
+            channel = st.selectbox('Select Channel', options['Channel'])
+            
+            # Product Class filter
+            product_class = st.selectbox('Select Product Class', options['Product Class'])
+            
+            # Sales Team filter
+            sales_team = st.selectbox('Select Sales Team', options['Sales Team'])
+            
+            submitted = st.form_submit_button('Apply')
         
-        if selected_country != 'All':
-            filtered_df = filtered_df[filtered_df['Country'] == selected_country]
-        if selected_channel != 'All':
-            filtered_df = filtered_df[filtered_df['Channel'] == selected_channel]
-        if selected_product_class != 'All':
-            filtered_df = filtered_df[filtered_df['Product Class'] == selected_product_class]
-        if selected_sales_team != 'All':
-            filtered_df = filtered_df[filtered_df['Sales Team'] == selected_sales_team]
+        # Keep the last applied filters for this file across unrelated reruns
+        if submitted or st.session_state.get('filters_file_hash') != file_hash:
+            st.session_state['filters'] = (country, channel, product_class, sales_team)
+            st.session_state['filters_file_hash'] = file_hash
+        (selected_country, selected_channel,
+         selected_product_class, selected_sales_team) = st.session_state['filters']
         
-        # Calculate metrics for KPI cards
-        total_sales = filtered_df['predicted_sales'].sum()
-        avg_monthly_sales = filtered_df.groupby('month_year')['predicted_sales'].sum().mean()
+        # Filter and aggregate, memoized per file and filter selection
+        view = compute_view(file_hash, df, selected_country, selected_channel,
+                            selected_product_class, selected_sales_team)
+        if view is None:
+            st.warning('No rows match the selected filters')
+            st.stop()
         
-        # Create KPI cards using columns
-        col1, col2, col3, col4 = st.columns(4)
+        total_sales = view['total_sales']
+        avg_monthly_sales = view['avg_monthly_sales']
+        top_distributor = view['top_distributor']
+        distributor_sales = view['distributor_sales']
+        top_product = view['top_product']
+        product_sales = view['product_sales']
         
-        with col1:
-            st.markdown(f"""
+        # Render all four KPI cards as one flex row in a single markdown call
+        cards_html = f"""
+            <div class="metric-row">
                 <div class="metric-card">
                     <div class="metric-label">Total Predicted Sales</div>
                     <div class="metric-value">${total_sales:,.0f}</div>
                 </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(f"""
                 <div class="metric-card">
                     <div class="metric-label">Average Monthly Sales</div>
                     <div class="metric-value">${avg_monthly_sales:,.0f}</div>
                 </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            top_distributor = (filtered_df.groupby('Distributor')['predicted_sales']
-                             .sum().sort_values(ascending=False).index[0])
-            distributor_sales = (filtered_df.groupby('Distributor')['predicted_sales']
-                               .sum().sort_values(ascending=False).iloc[0])
-            
-            st.markdown(f"""
                 <div class="metric-card">
                     <div class="metric-label">Top Distributor</div>
                     <div class="metric-value">{top_distributor}</div>
                     <div class="metric-label">${distributor_sales:,.0f} in sales</div>
                 </div>
-            """, unsafe_allow_html=True)
-        
-        with col4:
-            top_product = (filtered_df.groupby('Product Name')['predicted_sales']
-                          .sum().sort_values(ascending=False).index[0])
-            product_sales = (filtered_df.groupby('Product Name')['predicted_sales']
-                           .sum().sort_values(ascending=False).iloc[0])
-            
-            st.markdown(f"""
                 <div class="metric-card">
                     <div class="metric-label">Best Selling Product</div>
                     <div class="metric-value">{top_product}</div>
                     <div class="metric-label">${product_sales:,.0f} in sales</div>
                 </div>
-            """, unsafe_allow_html=True)
-        
-        # Group by month_year and calculate monthly total predicted sales
-        monthly_sales = (filtered_df.groupby('month_year')['predicted_sales']
-                        .sum()
-                        .reset_index())
-        
-        # Sort the monthly sales by year and month
-        month_order = ['January', 'February', 'March', 'April', 'May', 'June', 
-                      'July', 'August', 'September', 'October', 'November', 'December']
-        
-        # Create a sorting key
-        monthly_sales['sort_key'] = monthly_sales['month_year'].apply(
-            lambda x: pd.to_datetime(x, format='%B %Y')
-        )
-        monthly_sales = monthly_sales.sort_values('sort_key')
-        
-        # Create the line chart using Plotly with dark theme
-        fig = px.line(
-            monthly_sales,
-            x='month_year',
-            y='predicted_sales',
-            title='Predicted Monthly Sales'
-        )
-        
-        # Update layout for dark theme
-        fig.update_layout(
-            template="plotly_dark",
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            xaxis_title="Month-Year",
-            yaxis_title="Predicted Sales",
-            hovermode='x unified'
-        )
+            </div>
+        """
+        st.markdown(cards_html, unsafe_allow_html=True)
         
         # Display the plot
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(build_monthly_chart(view['monthly_sales']), use_container_width=True)
         
         # Display detailed data view
         st.subheader("Detailed Data View")
-        display_columns = ['month_year', 'Distributor', 'Customer Name', 'Country', 
-                         'Channel', 'Product Name', 'Product Class', 
-                         'Quantity', 'Price', 'predicted_sales']
-        
-        # Create a copy of the filtered dataframe with only the display columns
-        display_df = filtered_df[display_columns].copy()
-        
-        # Add sort_key to display_df
-        display_df['sort_key'] = pd.to_datetime(display_df['month_year'], format='%B %Y')
+        row_positions = view['row_positions']
         
-        # Sort by sort_key and drop it before display
-        display_df = display_df.sort_values('sort_key').drop('sort_key', axis=1)
+        # Only take and serialize the current page from the shared DataFrame;
+        # row_positions is already sorted by period
+        n_pages = max(1, -(-len(row_positions) // PAGE_SIZE))
+        page = st.number_input('Page', min_value=1, max_value=n_pages, value=1, step=1)
+        st.caption(f"Page {page} of {n_pages} ({len(row_positions):,} rows)")
+        page_rows = row_positions[(page - 1) * PAGE_SIZE : page * PAGE_SIZE]
+        page_df = df.iloc[page_rows][DISPLAY_COLUMNS]
         
-        st.dataframe(display_df, hide_index=True)
+        st.dataframe(page_df, hide_index=True)
 
 if __name__ == "__main__":
     # Set page configuration